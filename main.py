@@ -1,141 +1,545 @@
+import base64
+import calendar
+import math
 import os
+import queue
+import sys
 import tarfile
+import tempfile
 import io
+import threading
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from contextlib import closing, contextmanager
 from datetime import datetime
-from typing import Any
+from typing import IO, Any, Iterable, Iterator
 
 import bson
+import zstandard
+from bson import Binary, Code, Int64, ObjectId
 from pymongo import MongoClient
-from bson.json_util import dumps  # Use dumps for Extended JSON
-import json
+from bson.json_util import default, dumps  # Use these for Extended JSON
+import orjson
+
+# Chunk size for copying buffers into the tarfile (tarfile defaults to 16 KiB),
+# also used as the write buffer size of the files being written
+COPY_BUFSIZE = 2 * 1024 * 1024
+
+# Archive file suffix for each supported DUMP__COMPRESSION value
+ARCHIVE_SUFFIXES = {"none": ".tar", "zstd": ".tar.zst"}
+
+# MongoClient kept across warm invocations, keyed by URL and compressors
+_clients: dict[tuple[str, str | None], MongoClient] = {}
+
+
+def log(msg: str, level: str = "INFO") -> None:
+    """
+    Writes a structured log line to stdout.
+
+    Args:
+        msg (str): Log message.
+        level (str): Log level.
+    """
+    line = orjson.dumps({"msg": msg, "level": level, "stream_name": "main"}) + b"\n"
+
+    # Write the bytes as-is when stdout exposes its binary buffer, and flush
+    # right away, so the line survives the instance being killed
+    stream = getattr(sys.stdout, "buffer", None)
+    if stream is not None:
+        stream.write(line)
+        stream.flush()
+    else:
+        sys.stdout.write(line.decode())
+        sys.stdout.flush()
+
+
+def ejson_default(obj: Any) -> Any:
+    """
+    Encodes the BSON types orjson does not support natively as Extended JSON.
+
+    The types found in collection metadata are encoded inline, anything else
+    falls back to bson.json_util. Subclasses of builtins are passed through to
+    here as well, so Int64 and Code keep their types instead of being written
+    as plain numbers and strings.
+
+    Args:
+        obj (Any): Object to encode.
+    """
+    if isinstance(obj, Int64):
+        return {"$numberLong": str(obj)}
+    if isinstance(obj, ObjectId):
+        return {"$oid": str(obj)}
+    if isinstance(obj, Binary):
+        return {
+            "$binary": {
+                "base64": base64.b64encode(obj).decode(),
+                "subType": f"{obj.subtype:02x}",
+            }
+        }
+    if isinstance(obj, datetime):
+        millis = calendar.timegm(obj.utctimetuple()) * 1000 + obj.microsecond // 1000
+        return {"$date": {"$numberLong": str(millis)}}
+    if isinstance(obj, Code):
+        return default(obj, json_options=bson.json_util.CANONICAL_JSON_OPTIONS)
+    # Other subclasses (e.g. SON) are written as their plain builtin
+    if isinstance(obj, dict):
+        return dict(obj)
+    if isinstance(obj, list):
+        return list(obj)
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    return default(obj, json_options=bson.json_util.CANONICAL_JSON_OPTIONS)
+
+
+def has_non_finite_float(obj: Any) -> bool:
+    """
+    Checks whether a document contains an infinite or NaN double anywhere.
+
+    Args:
+        obj (Any): Document or value to check.
+    """
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(has_non_finite_float(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(has_non_finite_float(value) for value in obj)
+    return False
+
+
+def encode_metadata(metadata: dict[str, Any]) -> bytes:
+    """
+    Encodes collection metadata as Extended JSON.
+
+    Args:
+        metadata (dict): Metadata document to encode.
+    """
+    metadata_json = orjson.dumps(
+        metadata,
+        default=ejson_default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_SUBCLASS,
+    )
+
+    # orjson writes infinite and NaN doubles as null without calling default,
+    # so metadata holding any of them goes through bson.json_util instead
+    if b"null" in metadata_json and has_non_finite_float(metadata):
+        metadata_json = dumps(
+            metadata, json_options=bson.json_util.CANONICAL_JSON_OPTIONS
+        ).encode("utf-8")
+    return metadata_json
+
+
+def get_client(mongo_url: str, compressors: str | None) -> MongoClient:
+    """
+    Returns a MongoClient for the URL, reusing the one created by a previous
+    invocation of a warm function instance.
+
+    Args:
+        mongo_url (str): MongoDB connection URL.
+        compressors (str, optional): Comma-separated wire protocol compressors,
+            in order of preference, overriding any set in the URL. Empty to
+            disable compression, None to leave it to the URL.
+    """
+    key = (mongo_url, compressors)
+    client = _clients.get(key)
+    if client is None:
+        options = {}
+        if compressors is not None:
+            options["compressors"] = compressors.split(",") if compressors else []
+        client = _clients[key] = MongoClient(mongo_url, **options)
+    return client
 
 
 def get_config() -> dict[str, Any]:
     mongo__url = os.environ.get("MONGO__URL", None)
     mongo__db_name = os.environ.get("MONGO__DB_NAME", None)
+    mongo__compressors = os.environ.get("MONGO__COMPRESSORS", None)
     dump__dir = os.environ.get("DUMP__DIR", None)
+    # Memory use of the dump is bounded by these knobs. Up to DUMP__PARALLEL
+    # collections are dumped at once. DUMP__SPOOL_SIZE and DUMP__PREFETCH are
+    # budgets for the whole dump: each collection gets an equal share, split
+    # over the ranges it is actually read as (one, or DUMP__PARTITIONS _id
+    # ranges plus one for other _id types). A range's buffer keeps at most its
+    # share of DUMP__SPOOL_SIZE bytes in memory before spilling to a temporary
+    # file, and its cursor queues its share of DUMP__PREFETCH batches (at
+    # least one). A batch is DUMP__BATCH_SIZE documents, capped at 16 MiB by
+    # the server. On top of DUMP__SPOOL_SIZE, each range may hold its queued
+    # batches, one being fetched, one being written, and one more briefly
+    # while its buffer rolls over to disk.
+    dump__batch_size = int(os.environ.get("DUMP__BATCH_SIZE", "10000"))
+    dump__prefetch = int(os.environ.get("DUMP__PREFETCH", "16"))
+    dump__parallel = int(os.environ.get("DUMP__PARALLEL", "4"))
+    dump__partitions = int(os.environ.get("DUMP__PARTITIONS", "4"))
+    dump__partition_min_docs = int(
+        os.environ.get("DUMP__PARTITION_MIN_DOCS", "1000000")
+    )
+    dump__spool_size = int(os.environ.get("DUMP__SPOOL_SIZE", str(256 << 20)))
+    dump__compression = os.environ.get("DUMP__COMPRESSION", "none")
+
+    if dump__compression not in ARCHIVE_SUFFIXES:
+        log(f"Unsupported compression '{dump__compression}'.", "FATAL")
+        raise RuntimeError(f"Unsupported compression '{dump__compression}'.")
 
     if not all(v is not None for v in (mongo__url, mongo__db_name, dump__dir)):
-        print(
-            json.dumps(
-                {
-                    "msg": "Not all of the required env vars were set.",
-                    "level": "FATAL",
-                    "stream_name": "main",
-                }
-            )
-        )
+        log("Not all of the required env vars were set.", "FATAL")
         raise RuntimeError("Not all of the required env vars were set.")
 
+    if dump__parallel < 1 or dump__partitions < 1:
+        log("DUMP__PARALLEL and DUMP__PARTITIONS must be at least 1.", "FATAL")
+        raise RuntimeError("DUMP__PARALLEL and DUMP__PARTITIONS must be at least 1.")
+
     config = {
         "mongo__url": mongo__url,
         "mongo__db_name": mongo__db_name,
+        "mongo__compressors": mongo__compressors,
         "dump__dir": dump__dir,
+        "dump__batch_size": dump__batch_size,
+        "dump__prefetch": dump__prefetch,
+        "dump__parallel": dump__parallel,
+        "dump__partitions": dump__partitions,
+        "dump__partition_min_docs": dump__partition_min_docs,
+        "dump__spool_size": dump__spool_size,
+        "dump__compression": dump__compression,
     }
 
-    print(
-        json.dumps(
-            {
-                "msg": f"Configuration successfully retrieved. Database: '{mongo__db_name}', Dump directory: '{dump__dir}'.",
-                "level": "INFO",
-                "stream_name": "main",
-            }
-        )
+    log(
+        f"Configuration successfully retrieved. Database: '{mongo__db_name}', Dump directory: '{dump__dir}'."
     )
 
     return config
 
 
-def dump_collection(collection_name: str, db, tar: tarfile.TarFile) -> None:
+class ChainedReader:
     """
-    Dumps a single collection to the tarfile.
+    Read-only file object reading several files back to back, as if they
+    were a single file.
+    """
+
+    def __init__(self, files: Iterable[IO[bytes]]) -> None:
+        """
+        Args:
+            files (Iterable[IO[bytes]]): Files to read, positioned at their start.
+        """
+        self._files = list(files)
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Reads up to `size` bytes, crossing into the next file as needed.
+
+        Args:
+            size (int): Number of bytes to read, negative to read everything.
+        """
+        chunks = []
+        remaining = size
+        while self._files and remaining != 0:
+            chunk = self._files[0].read(remaining)
+            if not chunk:
+                self._files.pop(0)
+                continue
+            chunks.append(chunk)
+            if remaining > 0:
+                remaining -= len(chunk)
+        return b"".join(chunks)
+
+
+def wait_all(executor: ThreadPoolExecutor, futures: list[Future]) -> None:
+    """
+    Waits for all futures, cancelling the ones not started yet as soon as one
+    of them fails, and raises that failure.
 
     Args:
-        collection_name (str): Name of the collection to dump.
-        db: The database object.
-        tar (tarfile.TarFile): Tarfile object to add the collection dump to.
-        config (dict): Configuration dictionary containing database info.
+        executor (ThreadPoolExecutor): Executor the futures were submitted to.
+        futures (list[Future]): Futures to wait for.
     """
-    print(
-        json.dumps(
-            {
-                "msg": f"Starting dump of collection '{collection_name}'.",
-                "level": "INFO",
-                "stream_name": "main",
-            }
-        )
-    )
+    done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+    for future in futures:
+        if future in done and future.exception() is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            future.result()
 
-    bson_file_name = f"dump/{db.name}/{collection_name}.bson"
-    metadata_file_name = f"dump/{db.name}/{collection_name}.metadata.json"
 
-    collection = db[collection_name]
+def prefetch_batches(cursor: Iterable[bytes], depth: int) -> Iterator[bytes]:
+    """
+    Iterates over a cursor in a background thread, so the next batches are
+    fetched from the server while the current one is being written.
+
+    Args:
+        cursor (Iterable[bytes]): Cursor yielding raw BSON batches.
+        depth (int): Maximum number of batches fetched ahead of the consumer.
+    """
+    batches: queue.Queue = queue.Queue(maxsize=max(depth, 1))
+    stop = threading.Event()
+    done = object()
+
+    def put(item: Any) -> None:
+        # Give up once the consumer is gone, instead of blocking forever
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce() -> None:
+        try:
+            for batch in cursor:
+                if stop.is_set():
+                    return
+                put(batch)
+            put(done)
+        except BaseException as e:
+            # Any error, not just Exception, must reach the consumer, or it
+            # would wait for the next batch forever
+            put(e)
+        finally:
+            close = getattr(cursor, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
 
     try:
-        # Dump collection data to a BytesIO object
-        bson_buffer = io.BytesIO()
-        cursor = collection.find()
+        while True:
+            item = batches.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def partition_filters(
+    collection, document_count: int, config: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """
+    Splits a large collection into `_id` ranges that can be read concurrently.
 
-        # Iterate over documents in the collection
-        for document in cursor:
-            # Encode each document to BSON and write to the buffer
-            bson_buffer.write(bson.BSON.encode(document))
+    Split points are picked from a random sample of ObjectId `_id`s. Documents
+    with any other `_id` type get a range of their own, so every document is
+    matched by exactly one filter.
 
-        # Create a TarInfo object for the bson file
-        bson_tarinfo = tarfile.TarInfo(name=bson_file_name)
-        bson_tarinfo.size = bson_buffer.tell()
-        bson_buffer.seek(0)  # Reset buffer pointer to the beginning
+    Args:
+        collection: The collection to split.
+        document_count (int): Number of documents in the collection, as
+            reported by collStats.
+        config (dict): Configuration dictionary containing database info.
 
-        # Add the bson buffer to the tarfile
-        tar.addfile(bson_tarinfo, fileobj=bson_buffer)
+    Returns:
+        list[dict]: Query filters covering the whole collection.
+    """
+    partitions = config["dump__partitions"]
+    if partitions < 2:
+        return [{}]
+    if document_count < config["dump__partition_min_docs"]:
+        return [{}]
+
+    # $sample with a small size uses a random cursor instead of a collection scan
+    sample = collection.aggregate(
+        [{"$sample": {"size": partitions * 16}}, {"$project": {"_id": 1}}]
+    )
+    ids = sorted({doc["_id"] for doc in sample if isinstance(doc["_id"], ObjectId)})
+    if not ids:
+        return [{}]
+    bounds = sorted({ids[len(ids) * i // partitions] for i in range(1, partitions)})
 
-        # Extract index information for the collection
-        indexes = collection.list_indexes()
-        index_list = []
+    # Range comparisons on ObjectId only ever match ObjectIds
+    filters: list[dict[str, Any]] = [{"_id": {"$lt": bounds[0]}}]
+    for lower, upper in zip(bounds, bounds[1:]):
+        filters.append({"_id": {"$gte": lower, "$lt": upper}})
+    filters.append({"_id": {"$gte": bounds[-1]}})
+    filters.append({"_id": {"$not": {"$type": "objectId"}}})
+    return filters
 
-        for index_info in indexes:
-            # Convert index_info to a dict if it's a SON object
-            index_info = dict(index_info)
 
-            # Remove the 'ns' field (namespace) as it's not required
-            index_info.pop("ns", None)
+def range_share(budget: int, ranges: int, config: dict[str, Any]) -> int:
+    """
+    Splits a budget shared by the whole dump over the ranges of one collection,
+    out of DUMP__PARALLEL collections dumped at once.
+
+    Args:
+        budget (int): Budget for the whole dump.
+        ranges (int): Number of ranges the collection is read as.
+        config (dict): Configuration dictionary containing database info.
+    """
+    return max(budget // (config["dump__parallel"] * ranges), 1)
 
-            # Append the index_info to the index_list
-            index_list.append(index_info)
 
-        # Retrieve the collection options
-        options = collection.options()
+def dump_range(
+    collection,
+    filter: dict[str, Any],
+    buffer: IO[bytes],
+    prefetch: int,
+    config: dict[str, Any],
+    stop: threading.Event | None = None,
+) -> None:
+    """
+    Writes the documents matching a filter to a buffer as raw BSON.
 
-        # Get the collection UUID if available
-        collection_info = db.command(
-            "listCollections", filter={"name": collection_name}
+    Args:
+        collection: The collection to read from.
+        filter (dict): Query filter selecting the documents.
+        buffer (IO[bytes]): Buffer to write the documents to.
+        prefetch (int): Maximum number of batches fetched ahead.
+        config (dict): Configuration dictionary containing database info.
+        stop (threading.Event, optional): When set, reading stops after the
+            current batch.
+    """
+    # An explicit session with no cursor timeout keeps the server from killing
+    # the cursor while a large range is still being read
+    with collection.database.client.start_session() as session:
+        # A large batch size keeps getMore round-trips to a minimum
+        cursor = collection.find_raw_batches(
+            filter,
+            batch_size=config["dump__batch_size"],
+            no_cursor_timeout=True,
+            session=session,
         )
-        collection_uuid = None
-        if "cursor" in collection_info:
-            for coll in collection_info["cursor"]["firstBatch"]:
-                if (
-                    coll["name"] == collection_name
-                    and "info" in coll
-                    and "uuid" in coll["info"]
-                ):
-                    collection_uuid = coll["info"]["uuid"]
-                    break
+
+        # Each batch is already a run of encoded BSON documents, so it can be
+        # written as-is without decoding and re-encoding every document
+        with closing(prefetch_batches(cursor, prefetch)) as batches:
+            for batch in batches:
+                if stop is not None and stop.is_set():
+                    return
+                buffer.write(batch)
+
+
+def dump_documents(
+    collection,
+    bson_file_name: str,
+    tar: tarfile.TarFile,
+    tar_lock: threading.Lock,
+    config: dict[str, Any],
+) -> None:
+    """
+    Dumps the documents of a collection to a bson file in the tarfile.
+
+    Args:
+        collection: The collection to dump.
+        bson_file_name (str): Name of the bson file in the tarfile.
+        tar (tarfile.TarFile): Tarfile object to add the bson file to.
+        tar_lock (threading.Lock): Lock serializing writes to the tarfile.
+        config (dict): Configuration dictionary containing database info.
+    """
+    # Dump each range of the collection to its own buffer, which stays in
+    # memory while small and spills to a temporary file once it grows.
+    # Small and empty collections are read with a single cursor right away;
+    # their data is still read since the collStats count may be stale.
+    stats = collection.database.command("collStats", collection.name)
+    filters = partition_filters(collection, stats.get("count", 0), config)
+    spool_size = range_share(config["dump__spool_size"], len(filters), config)
+    prefetch = range_share(config["dump__prefetch"], len(filters), config)
+    buffers = [
+        tempfile.SpooledTemporaryFile(max_size=spool_size, buffering=COPY_BUFSIZE)
+        for _ in filters
+    ]
+
+    try:
+        # Ranges expected to outgrow the spool go straight to disk, instead of
+        # growing an in-memory buffer first and copying it over on rollover.
+        # The last range of a partitioned collection only catches non-ObjectId
+        # _ids, is usually empty and is left out of the estimate.
+        id_buffers = buffers[:-1] if len(buffers) > 1 else buffers
+        if stats.get("size", 0) // len(id_buffers) > spool_size:
+            for buffer in id_buffers:
+                buffer.rollover()
+        if len(filters) == 1:
+            dump_range(collection, filters[0], buffers[0], prefetch, config)
+        else:
+            # All ranges run at once, so on the first failure the others are
+            # told to stop rather than just cancelled
+            stop = threading.Event()
+            with ThreadPoolExecutor(max_workers=len(filters)) as executor:
+                futures = [
+                    executor.submit(
+                        dump_range, collection, filter, buffer, prefetch, config, stop
+                    )
+                    for filter, buffer in zip(filters, buffers)
+                ]
+                try:
+                    wait_all(executor, futures)
+                except BaseException:
+                    stop.set()
+                    raise
+
+        # Stream the ranges back to back into a single bson file, so the data is
+        # not copied into another buffer first
+        bson_tarinfo = tarfile.TarInfo(name=bson_file_name)
+        bson_tarinfo.size = sum(buffer.tell() for buffer in buffers)
+        for buffer in buffers:
+            buffer.seek(0)  # Reset buffer pointer to the beginning
+
+        # Add the bson buffers to the tarfile
+        with tar_lock:
+            tar.addfile(bson_tarinfo, fileobj=ChainedReader(buffers))
+    finally:
+        for buffer in buffers:
+            buffer.close()
+
+
+def dump_collection(
+    collection_info: dict[str, Any],
+    db,
+    tar: tarfile.TarFile,
+    tar_lock: threading.Lock,
+    config: dict[str, Any],
+) -> None:
+    """
+    Dumps a single collection to the tarfile.
+
+    Args:
+        collection_info (dict): The collection's listCollections entry.
+        db: The database object.
+        tar (tarfile.TarFile): Tarfile object to add the collection dump to.
+        tar_lock (threading.Lock): Lock serializing writes to the tarfile.
+        config (dict): Configuration dictionary containing database info.
+    """
+    collection_name = collection_info["name"]
+
+    log(f"Starting dump of collection '{collection_name}'.")
+
+    bson_file_name = f"dump/{db.name}/{collection_name}.bson"
+    metadata_file_name = f"dump/{db.name}/{collection_name}.metadata.json"
+
+    collection = db[collection_name]
+
+    try:
+        # Views hold no documents or indexes of their own, mongorestore
+        # recreates them from the metadata alone
+        is_view = collection_info.get("type") == "view"
+        if not is_view:
+            dump_documents(collection, bson_file_name, tar, tar_lock, config)
+
+        # Extract index information for the collection, without the 'ns'
+        # field (namespace) as it's not required
+        index_list = []
+        if not is_view:
+            index_list = [
+                {key: value for key, value in index_info.items() if key != "ns"}
+                for index_info in collection.list_indexes()
+            ]
+
+        # Retrieve the collection options and UUID (if available)
+        options = collection_info.get("options", {})
+        collection_uuid = collection_info.get("info", {}).get("uuid")
 
         # Create metadata document
         metadata = {
             "indexes": index_list,
             "uuid": collection_uuid,
             "collectionName": collection_name,
-            "type": "collection",
+            "type": "view" if is_view else "collection",
             "options": options,
         }
 
         # Write metadata to a BytesIO object using Extended JSON format
         metadata_buffer = io.BytesIO()
-        metadata_json = dumps(
-            metadata, json_options=bson.json_util.CANONICAL_JSON_OPTIONS
-        )
-        metadata_buffer.write(metadata_json.encode("utf-8"))
+        metadata_buffer.write(encode_metadata(metadata))
         metadata_size = metadata_buffer.tell()
         metadata_buffer.seek(0)  # Reset buffer pointer to the beginning
 
@@ -144,34 +548,50 @@ def dump_collection(collection_name: str, db, tar: tarfile.TarFile) -> None:
         metadata_tarinfo.size = metadata_size
 
         # Add the metadata buffer to the tarfile
-        tar.addfile(metadata_tarinfo, fileobj=metadata_buffer)
+        with tar_lock:
+            tar.addfile(metadata_tarinfo, fileobj=metadata_buffer)
 
-        # Close the buffers
-        bson_buffer.close()
+        # Close the buffer
         metadata_buffer.close()
 
-        print(
-            json.dumps(
-                {
-                    "msg": f"Successfully dumped collection '{collection_name}'.",
-                    "level": "INFO",
-                    "stream_name": "main",
-                }
-            )
-        )
+        log(f"Successfully dumped collection '{collection_name}'.")
     except Exception as e:
-        print(
-            json.dumps(
-                {
-                    "msg": f"Error dumping collection '{collection_name}': {e}",
-                    "level": "ERROR",
-                    "stream_name": "main",
-                }
-            )
-        )
+        log(f"Error dumping collection '{collection_name}': {e}", "ERROR")
         raise
 
 
+@contextmanager
+def open_archive(path: str, config: dict[str, Any]) -> Iterator[tarfile.TarFile]:
+    """
+    Opens the output tarfile for writing, compressing it if configured.
+
+    Args:
+        path (str): Path of the archive file.
+        config (dict): Configuration dictionary containing database info.
+    """
+    if config["dump__compression"] == "zstd":
+        # zstd compresses on its own worker threads, so the tarfile is
+        # streamed into it instead of being compressed by a single thread
+        compressor = zstandard.ZstdCompressor(level=3, threads=-1)
+        with (
+            open(path, "wb", buffering=COPY_BUFSIZE) as file,
+            compressor.stream_writer(file) as stream,
+            tarfile.open(
+                fileobj=stream,
+                mode="w|",
+                bufsize=COPY_BUFSIZE,
+                copybufsize=COPY_BUFSIZE,
+            ) as tar,
+        ):
+            yield tar
+    else:
+        with (
+            open(path, "wb", buffering=COPY_BUFSIZE) as file,
+            tarfile.open(fileobj=file, mode="w", copybufsize=COPY_BUFSIZE) as tar,
+        ):
+            yield tar
+
+
 def dump_database(config: dict[str, Any]) -> None:
     """
     Dumps the entire database to a tarfile.
@@ -182,57 +602,41 @@ def dump_database(config: dict[str, Any]) -> None:
     db_name = config["mongo__db_name"]
     mongo_url = config["mongo__url"]
     dump_dir = config["dump__dir"]
-    client = MongoClient(mongo_url)
+    client = get_client(mongo_url, config["mongo__compressors"])
     db = client[db_name]
 
-    print(
-        json.dumps(
-            {
-                "msg": f"Starting database dump for database '{db_name}'.",
-                "level": "INFO",
-                "stream_name": "main",
-            }
-        )
-    )
+    log(f"Starting database dump for database '{db_name}'.")
 
     try:
         # Output tarfile path
         tarfile_path = os.path.join(
             dump_dir,
-            f"{db_name}_backup_{datetime.utcnow().strftime("%Y_%m_%d_%H_%M_%S")}.tar.gz",
+            f"{db_name}_backup_{datetime.utcnow().strftime("%Y_%m_%d_%H_%M_%S")}"
+            + ARCHIVE_SUFFIXES[config["dump__compression"]],
         )
 
         # Create the dump directory if it doesn't exist
         os.makedirs(dump_dir, exist_ok=True)
 
         # Create a tarfile object for writing
-        with tarfile.open(tarfile_path, "w") as tar:
-            # Get the list of collections
-            collections = db.list_collection_names()
-
-            # Iterate over all collections in the database
-            for collection_name in collections:
-                dump_collection(collection_name, db, tar)
-
-        print(
-            json.dumps(
-                {
-                    "msg": f"Successfully completed database dump for database '{db_name}'.",
-                    "level": "INFO",
-                    "stream_name": "main",
-                }
-            )
-        )
+        with open_archive(tarfile_path, config) as tar:
+            # Get the list of collections along with their options and UUIDs
+            collections = list(db.list_collections())
+
+            # Dump collections concurrently, only the tarfile writes are serialized
+            tar_lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=config["dump__parallel"]) as executor:
+                futures = [
+                    executor.submit(
+                        dump_collection, collection_info, db, tar, tar_lock, config
+                    )
+                    for collection_info in collections
+                ]
+                wait_all(executor, futures)
+
+        log(f"Successfully completed database dump for database '{db_name}'.")
     except Exception as e:
-        print(
-            json.dumps(
-                {
-                    "msg": f"Error during database dump for database '{db_name}': {e}",
-                    "level": "ERROR",
-                    "stream_name": "main",
-                }
-            )
-        )
+        log(f"Error during database dump for database '{db_name}': {e}", "ERROR")
         raise
 
 
@@ -244,15 +648,7 @@ def handler(event: Any, context: Any) -> dict[str, Any]:
             "body": {"msg": "OK"},
         }
     except Exception as e:
-        print(
-            json.dumps(
-                {
-                    "msg": f"Unhandled exception in handler: {e}",
-                    "level": "FATAL",
-                    "stream_name": "main",
-                }
-            )
-        )
+        log(f"Unhandled exception in handler: {e}", "FATAL")
         return {
             "statusCode": 500,
             "body": {"msg": "Internal Server Error"},
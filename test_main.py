@@ -0,0 +1,73 @@
+import math
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import SON, Binary, Code, Int64, ObjectId
+from bson.json_util import CANONICAL_JSON_OPTIONS, dumps, loads
+
+from main import encode_metadata
+
+
+def roundtrip(metadata):
+    return loads(encode_metadata(metadata), json_options=CANONICAL_JSON_OPTIONS)
+
+
+def test_encode_metadata_matches_json_util():
+    metadata = {
+        "indexes": [
+            SON([("v", 2), ("key", SON([("_id", 1)])), ("name", "_id_")]),
+            SON(
+                [
+                    ("v", 2),
+                    ("key", SON([("createdAt", 1)])),
+                    ("name", "createdAt_1"),
+                    ("expireAfterSeconds", Int64(3600)),
+                ]
+            ),
+        ],
+        "uuid": Binary.from_uuid(uuid.uuid4()),
+        "collectionName": "events",
+        "type": "collection",
+        "options": {
+            "capped": True,
+            "size": Int64(1 << 40),
+            "validator": {
+                "$where": Code("this.a > 0"),
+                "scoped": Code("x", {"a": 1}),
+                "since": datetime(2020, 1, 2, 3, 4, 5, 678000),
+                "owner": ObjectId(),
+            },
+        },
+    }
+
+    decoded = roundtrip(metadata)
+    expected = loads(
+        dumps(metadata, json_options=CANONICAL_JSON_OPTIONS),
+        json_options=CANONICAL_JSON_OPTIONS,
+    )
+
+    assert decoded == expected
+    assert isinstance(decoded["options"]["size"], Int64)
+    assert isinstance(decoded["indexes"][1]["expireAfterSeconds"], Int64)
+    assert isinstance(decoded["options"]["validator"]["$where"], Code)
+    assert decoded["options"]["validator"]["scoped"].scope == {"a": 1}
+    assert isinstance(decoded["uuid"], Binary)
+    assert decoded["uuid"].subtype == 4
+    assert list(decoded["indexes"][1]) == list(metadata["indexes"][1])
+
+
+@pytest.mark.parametrize("value", [math.inf, -math.inf, math.nan])
+def test_encode_metadata_keeps_non_finite_doubles(value):
+    metadata = {
+        "uuid": None,
+        "options": {"validator": {"score": SON([("$gt", value)])}},
+    }
+
+    decoded = roundtrip(metadata)["options"]["validator"]["score"]["$gt"]
+
+    assert isinstance(decoded, float)
+    if math.isnan(value):
+        assert math.isnan(decoded)
+    else:
+        assert decoded == value